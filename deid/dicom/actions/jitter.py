@@ -2,13 +2,183 @@ __author__ = "Vanessa Sochat"
 __copyright__ = "Copyright 2016-2025, Vanessa Sochat"
 __license__ = "MIT"
 
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
+
 from pydicom.multival import MultiValue
 
 from deid.logger import bot
+from deid.logger.message import DEBUG, WARNING
 from deid.utils import get_timestamp, parse_keyvalue_pairs
 
 # Timestamps
 
+# Sequence types that mark a field as multi-valued
+_SEQ_TYPES = (MultiValue, list, tuple)
+
+# What a failed parse or date shift can actually raise - anything else
+# is a bug and should propagate
+_PARSE_ERRORS = (ValueError, TypeError, OverflowError)
+
+# The fast-path helpers pre-validate their digits, so a failure can only
+# be an impossible date or an out-of-range shift. TypeError is excluded
+# on purpose: there it can only mean a non-integer days value, a caller
+# contract violation that should surface rather than silently fall
+# through to the generic path.
+_FAST_PATH_ERRORS = (ValueError, OverflowError)
+
+# Multi-value fields larger than this (e.g. dynamic PET frame times) are
+# jittered through a thread pool. Parsing is CPU-bound Python, so threads
+# only overlap the C-level parsing work and the win is modest; small
+# fields skip the pool overhead entirely.
+_PARALLEL_THRESHOLD = 256
+
+# Fixed layouts for the fast-path parsers. A failed match is a cheap
+# predictable branch, where a raised ValueError from strptime is not.
+_DA_RE = re.compile(r"\d{8}\Z")
+_DT_RE = re.compile(r"(\d{14})(?:\.(\d+))?([+-]\d{4})?\Z")
+
+# Formats to attempt for each DICOM Value Representation. DA (Date) is
+# NEMA-compliant YYYYMMDD, DT (Datetime) is YYYYMMDDHHMMSS.FFFFFF&ZZXX.
+# For any other VR we attempt all supported formats. The timezone-aware
+# DT format is listed first so offsets are preserved in the output.
+_VR_FORMATS = {
+    "DA": ("%Y%m%d",),
+    "DT": ("%Y%m%d%H%M%S.%f%z", "%Y%m%d%H%M%S.%f"),
+    None: ("%Y%m%d", "%Y%m%d%H%M%S.%f%z", "%Y%m%d%H%M%S.%f"),
+}
+
+# DT fractional seconds and timezone offsets are visible in the string
+# itself, so the right format can be chosen by shape instead of trial
+# and error, keyed on (has fraction, has offset)
+_DT_FORMATS = {
+    (False, False): "%Y%m%d%H%M%S",
+    (True, False): "%Y%m%d%H%M%S.%f",
+    (True, True): "%Y%m%d%H%M%S.%f%z",
+    (False, True): "%Y%m%d%H%M%S%z",
+}
+
+# Interning the format strings makes strptime's per-format regex cache
+# lookups identity hits, and one throwaway parse per format at import
+# compiles those regexes so the first de-identified file does not pay
+# the compile cost.
+_VR_FORMATS = {vr: tuple(map(sys.intern, fmts)) for vr, fmts in _VR_FORMATS.items()}
+_DT_FORMATS = {shape: sys.intern(fmt) for shape, fmt in _DT_FORMATS.items()}
+for _sample, _fmt in (
+    ("20000101", "%Y%m%d"),
+    ("20000101000000.000000", "%Y%m%d%H%M%S.%f"),
+    ("20000101000000.000000+0000", "%Y%m%d%H%M%S.%f%z"),
+):
+    datetime.strptime(_sample, _fmt)
+
+# Remember the last format that parsed for each (VR, value length) pair.
+# Within one de-id run values overwhelmingly share a shape, so trying the
+# remembered format first means only the first value of a batch pays for
+# failed attempts. Keying on length keeps differently shaped values (e.g.,
+# a bare date and a full timestamp under the same VR) from sharing a hint.
+_FORMAT_HINT = {}
+
+
+def _jitter_da(value, days):
+    """
+    Jitter a NEMA-compliant DA value (YYYYMMDD) by slicing its digits
+    directly, avoiding the generic format-string parser on the hot path.
+    Returns None if the value does not have the fixed DA layout.
+    """
+    if not _DA_RE.match(value):
+        return None
+    try:
+        moved = datetime(int(value[0:4]), int(value[4:6]), int(value[6:8])) + timedelta(
+            days=days
+        )
+    except _FAST_PATH_ERRORS:
+        return None
+    return moved.strftime("%Y%m%d")
+
+
+def _jitter_dt(value, days):
+    """
+    Jitter a NEMA-compliant DT value (YYYYMMDDHHMMSS with optional
+    fractional seconds and timezone offset) by slicing its digits
+    directly. Only the date portion moves, so the time, fraction, and
+    offset are carried over unchanged. Returns None if the value does
+    not have the fixed DT layout.
+    """
+    match = _DT_RE.match(value)
+    if not match:
+        return None
+    value, fraction, offset = match.groups()
+    fraction = ((fraction or "") + "000000")[:6]
+    offset = offset or ""
+    try:
+        moved = datetime(
+            int(value[0:4]),
+            int(value[4:6]),
+            int(value[6:8]),
+            int(value[8:10]),
+            int(value[10:12]),
+            int(value[12:14]),
+        ) + timedelta(days=days)
+    except _FAST_PATH_ERRORS:
+        return None
+    return "%s.%s%s" % (moved.strftime("%Y%m%d%H%M%S"), fraction, offset)
+
+
+@lru_cache(maxsize=4096)
+def _cached_jitter(value, days, fmt):
+    """
+    Memoized get_timestamp, since identical date strings recur constantly
+    across files from the same study (and within multi-value fields). The
+    cache is bounded so adversarial inputs cannot grow it without limit.
+    """
+    return get_timestamp(value, jitter_days=days, format=fmt)
+
+
+def _jitter_one(value, days, vr):
+    """
+    Jitter a single date or timestamp string by a number of days.
+
+    Values with the fixed DA/DT layouts take a sliced fast path; anything
+    else falls back to attempting each format for the VR in turn, where
+    the first that parses wins. Returns the jittered string, or None if
+    no format could parse the value.
+    """
+    if isinstance(value, str):
+        if vr == "DA":
+            jittered = _jitter_da(value, days)
+            if jittered:
+                return jittered
+        elif vr == "DT":
+            jittered = _jitter_dt(value, days)
+            if jittered:
+                return jittered
+
+    bucket = vr if vr in _VR_FORMATS else None
+    key = (bucket, len(value) if isinstance(value, str) else -1)
+    hint = _FORMAT_HINT.get(key)
+    if vr == "DT" and isinstance(value, str):
+        # The DT shape picks the format outright, no trial and error
+        hint = _DT_FORMATS[("." in value, len(value) > 5 and value[-5] in "+-")]
+    if hint:
+        try:
+            return _cached_jitter(value, days, hint)
+        except _PARSE_ERRORS:
+            pass
+    for fmt in _VR_FORMATS[bucket]:
+        if fmt == hint:
+            continue
+        try:
+            jittered = _cached_jitter(value, days, fmt)
+        except _PARSE_ERRORS:
+            continue
+        _FORMAT_HINT[key] = fmt
+        return jittered
+    return None
+
 
 def jitter_timestamp_func(item, value, field, **kwargs):
     """
@@ -36,66 +206,67 @@ def jitter_timestamp(field, value):
     Parameters
     ==========
     field: the field with the timestamp
-    value: number of days to jitter by. Jitter bug!
+    value: number of days to jitter by, as an integer. Jitter bug!
+           Callers are expected to coerce beforehand (the wrapper above
+           and the parser both do) so the hot path does not re-check.
     """
-    if not isinstance(value, int):
-        value = int(value)
+    # Surface a non-int from a direct call-site; skipped under -O
+    if __debug__:
+        assert isinstance(value, int), "jitter days must be an integer"
 
-    original = field.element.value
+    # Descend to the element once - its value can re-decode on access
+    element = field.element
+    field_name = field.name
+    original = element.value
 
-    # Early exit for empty values
+    # Early exit for empty values, before any other work
     if not original:
         return None
 
-    # Normalize to list for uniform processing of multi-value fields
-    is_multi_values = isinstance(original, (list, tuple, MultiValue))
-    values = list(original) if is_multi_values else [original]
-    dcmvr = field.element.VR
-
-    jittered = []
-    for val in values:
-        # Create default for new value
-        single_value = None
-
-        # DICOM Value Representation can be either DA (Date) DT (Timestamp),
-        # or something else, which is not supported.
-        if dcmvr == "DA":
-            # NEMA-compliant format for DICOM date is YYYYMMDD
-            single_value = get_timestamp(val, jitter_days=value, format="%Y%m%d")
-
-        elif dcmvr == "DT":
-            # NEMA-compliant format for DICOM timestamp is
-            # YYYYMMDDHHMMSS.FFFFFF&ZZXX
-            try:
-                single_value = get_timestamp(
-                    val, jitter_days=value, format="%Y%m%d%H%M%S.%f%z"
-                )
-            except Exception:
-                single_value = get_timestamp(
-                    val, jitter_days=value, format="%Y%m%d%H%M%S.%f"
-                )
+    dcmvr = element.VR
 
-        else:
-            # If the field type is not supplied, attempt to parse different formats
-            for fmtstr in ["%Y%m%d", "%Y%m%d%H%M%S.%f%z", "%Y%m%d%H%M%S.%f"]:
-                try:
-                    single_value = get_timestamp(val, jitter_days=value, format=fmtstr)
-                    break
-                except Exception:
-                    pass
-
-            # If nothing works, do nothing and issue a warning.
-            if not single_value:
-                bot.warning(
-                    f"JITTER not supported for tag={field.element.tag}, name={field.name}, VR={dcmvr}"
+    # Values that fail to jitter keep their original value. Rather than
+    # logging per element, count fallbacks and warn once at the end.
+    if isinstance(original, _SEQ_TYPES):
+        # For multi-value DICOM fields, return as backslash-separated string
+        total = len(original)
+        failed = 0
+        if total > _PARALLEL_THRESHOLD:
+            with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                results = executor.map(
+                    lambda val: _jitter_one(val, value, dcmvr), original
                 )
+                jittered = [new or old for new, old in zip(results, original)]
+            failed = sum(1 for new, old in zip(jittered, original) if new is old)
+        else:
+            # Preallocate and fill in one pass, counting fallbacks as we go
+            jittered = [None] * total
+            for i, val in enumerate(original):
+                new = _jitter_one(val, value, dcmvr)
+                if new:
+                    jittered[i] = new
+                else:
+                    jittered[i] = val
+                    failed += 1
+        new_value = "\\".join(map(str, jittered))
+    else:
+        single_value = _jitter_one(original, value, dcmvr)
+        failed = 0 if single_value else 1
+        total = 1
+        new_value = single_value or original
 
-        # If jittering failed (single_value is None), keep the original value
-        jittered.append(single_value if single_value else val)
+    if failed:
+        # The message is only built when the logger will emit it
+        if bot.isEnabledFor(WARNING):
+            bot.warning(
+                f"JITTER not supported for {failed}/{total} values of "
+                f"tag={element.tag}, name={field_name}, VR={dcmvr}"
+            )
+    elif bot.isEnabledFor(DEBUG):
+        # type name rather than repr - cheap, and only built at debug level
+        bot.debug(
+            f"Jitter returning {total} value(s) "
+            f"(type: {type(new_value).__name__}) for field {field_name}"
+        )
 
-    # Return in same format as input
-    if is_multi_values:
-        # For multi-value DICOM fields, return as backslash-separated string
-        return "\\".join(str(v) for v in jittered)
-    else:
-        return jittered[0]
+    return new_value
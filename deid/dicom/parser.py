@@ -621,8 +621,8 @@ class DicomParser:
                 funcs=self.deid_funcs,
             )
             if value is not None:
-                # Jitter the field by the supplied value
-                new_val = jitter_timestamp(field=field, value=value)
+                # Jitter the field by the supplied value (integer days)
+                new_val = jitter_timestamp(field=field, value=int(float(value)))
                 if new_val not in [None, ""]:
                     self.replace_field(field, new_val)
             else:
@@ -135,6 +135,23 @@ class TestDicomUtils(unittest.TestCase):
         expected = None
         self.assertEqual(actual, expected)
 
+        print("Case 8: Testing with multi-value dates above the parallel threshold")
+        name = "DateOfLastCalibration"
+        tag = get_tag(name)
+        dates = ["20131210"] * 300
+        dates[5] = "notadate"
+        dates[250] = "notadate"
+        dicom.DateOfLastCalibration = dates
+        dicom.data_element(name).VR = "DA"
+        field = DicomField(dicom.data_element(name), name, str(tag["tag"]))
+        actual = jitter_timestamp(field, 10).split("\\")
+        self.assertEqual(300, len(actual))
+        for i, jittered_value in enumerate(actual):
+            if i in (5, 250):
+                self.assertEqual("notadate", jittered_value)
+            else:
+                self.assertEqual("20131220", jittered_value)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -5,7 +5,8 @@ __license__ = "MIT"
 import re
 from datetime import datetime, timedelta
 
-import dateutil.parser
+from dateutil.parser import ParserError
+from dateutil.parser import parse as parse_date
 
 from deid.logger import bot
 
@@ -50,7 +51,6 @@ def parse_value(dicom, value, item=None, field=None, funcs=None):
                 bot.warning("%s not a known deid provided function." % (value_option))
                 return None
 
-            print(extras)
             # item is the lookup, value from the recipe, and field
             # The field is an entire dicom element object
             return funcs[value_option](
@@ -146,8 +146,8 @@ def get_timestamp(item_date, item_time=None, jitter_days=None, format=None):
     item_time = item_time or ""
 
     try:
-        timestamp = dateutil.parser.parse("%s%s" % (item_date, item_time))
-    except (dateutil.parser.ParserError, OverflowError):
+        timestamp = parse_date("%s%s" % (item_date, item_time))
+    except (ParserError, OverflowError):
         timestamp = datetime.strptime("%s%s" % (item_date, item_time), format)
 
     if jitter_days is not None: